@@ -292,7 +292,7 @@ const submitAudio = async () => {
   const downloadAudio = () => {
     if (response?.audio_download_url) {
       const link = document.createElement('a');
-      link.href = `http://localhost:8000${response.audio_download_url}`;
+      link.href = `http://localhost:8000${response.audio_download_url}?download=1`;
       link.download = response.audio_filename;
       link.click();
     }
@@ -1,63 +1,138 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from openai import OpenAI
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import asyncio
-import aiofiles
+import functools
+import httpx
 import os
-import uuid
+import re
+import secrets
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
 import logging
-from contextlib import asynccontextmanager
-import shutil
+from contextlib import AsyncExitStack, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load environment from .env if present
+load_dotenv()
+
 # Configuration
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
-TEMP_DIR = Path("temp")
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+UPLOAD_SPOOL_SIZE = 1 << 20  # Starlette keeps uploads up to 1 MiB in memory
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))  # 50 MiB
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + (1 << 20)  # Leave room for multipart overhead
+# Keep a copy of every uploaded question in UPLOAD_DIR (exempt from cleanup)
+ARCHIVE_UPLOADS = os.getenv("ARCHIVE_UPLOADS", "0") == "1"
+
+# Cap concurrent calls per OpenAI endpoint to avoid 429 storms under burst load
+STT_SEM = asyncio.Semaphore(int(os.getenv("STT_CONCURRENCY", "10")))
+LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "10")))
+TTS_SEM = asyncio.Semaphore(int(os.getenv("TTS_CONCURRENCY", "10")))
+
+# LLM -> TTS pipelining: flush a segment to TTS at a sentence boundary once it
+# has at least this many characters, with at most this many segments of one
+# request in TTS at a time (each counts against TTS_CONCURRENCY)
+TTS_SEGMENT_MIN_CHARS = 80
+TTS_PIPELINE_DEPTH = 3
+SENTENCE_ENDINGS = (".", "!", "?")
+
+# Repeat questions reuse the (recommendation, mp3 path) of an earlier answer.
+# Every hit refreshes the mp3's mtime, so cleanup_old_files keeps it for at
+# least another hour after the URL is handed out.
+RESP_CACHE: TTLCache = TTLCache(maxsize=512, ttl=3600)
+_RESP_CACHE_LOCKS: Dict[Tuple[str, str], "_KeyLock"] = {}
+
+class _KeyLock:
+    """Per-key lock that counts holders and waiters, so it's only dropped once unused"""
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
 
 # Create directories
-for directory in [UPLOAD_DIR, OUTPUT_DIR, TEMP_DIR]:
+for directory in [UPLOAD_DIR, OUTPUT_DIR]:
     directory.mkdir(exist_ok=True)
 
-# Load environment from .env if present
-load_dotenv()
-
 # OpenAI API client
 api_key = os.getenv("OPENAI_API_KEY")
-client: Optional[OpenAI] = None
+client: Optional[AsyncOpenAI] = None
+# Bound SDK methods used on the hot path, resolved once instead of per call
+stt_create: Optional[Callable[..., Awaitable[Any]]] = None
+llm_create: Optional[Callable[..., Awaitable[Any]]] = None
+tts_create: Optional[Callable[..., Awaitable[Any]]] = None
+tts_stream_create: Optional[Callable[..., Any]] = None
 if not api_key:
     logger.warning(
         "OPENAI_API_KEY is not set. OpenAI-dependent endpoints will fail until it's configured."
     )
 else:
-    client = OpenAI(api_key=api_key)
+    # Shared HTTP/2 connection pool so concurrent calls reuse sockets
+    client = AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        ),
+    )
+    stt_create = client.audio.transcriptions.create
+    llm_create = client.chat.completions.create
+    tts_create = client.audio.speech.create
+    tts_stream_create = client.audio.speech.with_streaming_response.create
+
+async def _write_bytes(path, data: bytes) -> None:
+    """Write a file in a single thread hop (open + write + close)"""
+    await asyncio.to_thread(Path(path).write_bytes, data)
 
 # Cleanup old files periodically
+CLEANUP_DIRS = [OUTPUT_DIR] if ARCHIVE_UPLOADS else [UPLOAD_DIR, OUTPUT_DIR]
+
+def _cleanup_directory(directory: Path, current_time: float) -> None:
+    """Remove files in `directory` older than 1 hour (blocking)"""
+    # scandir entries carry cached type/stat info, avoiding a stat per file
+    with os.scandir(directory) as it:
+        stale = [
+            entry.path for entry in it
+            if entry.is_file() and (current_time - entry.stat().st_mtime) > 3600
+        ]
+    for path in stale:
+        try:
+            os.unlink(path)
+            logger.info(f"Cleaned up old file: {path}")
+        except Exception as e:
+            logger.error(f"Error cleaning up file {path}: {e}")
+
+def _sync_cleanup() -> None:
+    """Clean all directories in parallel, one worker thread per directory (blocking)"""
+    current_time = time.time()
+    with ThreadPoolExecutor(max_workers=len(CLEANUP_DIRS)) as executor:
+        for future in [executor.submit(_cleanup_directory, d, current_time) for d in CLEANUP_DIRS]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error in cleanup: {e}")
+
 async def cleanup_old_files():
     """Remove files older than 1 hour to save disk space"""
-    current_time = time.time()
-    for directory in [UPLOAD_DIR, OUTPUT_DIR, TEMP_DIR]:
-        for file_path in directory.glob("*"):
-            if file_path.is_file() and (current_time - file_path.stat().st_mtime) > 3600:
-                try:
-                    file_path.unlink()
-                    logger.info(f"Cleaned up old file: {file_path}")
-                except Exception as e:
-                    logger.error(f"Error cleaning up file {file_path}: {e}")
+    # The whole scan runs in one thread hop so it never stalls request handlers
+    await asyncio.to_thread(_sync_cleanup)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up Agricultural Audio Assistant API")
+    app.state.openai = client
     
     # Schedule periodic cleanup
     cleanup_task = asyncio.create_task(periodic_cleanup())
@@ -66,6 +141,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     cleanup_task.cancel()
+    if app.state.openai is not None:
+        await app.state.openai.close()
     logger.info("Shutting down Agricultural Audio Assistant API")
 
 async def periodic_cleanup():
@@ -79,6 +156,30 @@ async def periodic_cleanup():
         except Exception as e:
             logger.error(f"Error in periodic cleanup: {e}")
 
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads whose Content-Length is already too large before any of the
+    body is read, so Starlette never spools it. Runs as plain ASGI middleware
+    because FastAPI parses the form body before dependencies are resolved.
+    """
+    def __init__(self, app, path: str, max_size: int, detail: str):
+        self.app = app
+        self.path = path
+        self.max_size = max_size
+        self.detail = detail
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == self.path:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+                response = JSONResponse(
+                    {"detail": self.detail},
+                    status_code=413
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
 # FastAPI app initialization
 app = FastAPI(
     title="Agricultural Audio Assistant",
@@ -87,6 +188,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Upload size precheck (added before CORS so error responses still get CORS headers)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/recommend-from-audio",
+    max_size=MAX_REQUEST_SIZE,
+    detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MiB",
+)
+
+# Compress JSON/text responses; MP3 is already compressed, and audio/* is in
+# GZipMiddleware's default exclude_content_types (Starlette >= 1.5)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -99,43 +212,33 @@ app.add_middleware(
 # Serve static files
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
-async def transcribe_audio_async(file_path: str, language: str = "en") -> str:
+async def transcribe_audio_async(
+    filename: str, audio: Union[bytes, BinaryIO], content_type: Optional[str] = None, language: str = "en"
+) -> str:
     """
     Asynchronously transcribes audio using OpenAI's Whisper API.
     
     Args:
-        file_path (str): Path to the audio file
+        filename (str): Original file name, used by Whisper to detect the format
+        audio (bytes | BinaryIO): Audio content, or a readable file object
+        content_type (str): MIME type of the audio, if known
         language (str): Language code (default: 'en')
     
     Returns:
         str: Transcribed text
     """
     try:
-        async with aiofiles.open(file_path, "rb") as audio_file:
-            audio_content = await audio_file.read()
-            
-        # Create a temporary file for the API call
-        temp_file_path = TEMP_DIR / f"temp_audio_{uuid.uuid4().hex}.wav"
-        
-        async with aiofiles.open(temp_file_path, "wb") as temp_file:
-            await temp_file.write(audio_content)
-        
         if client is None:
             raise HTTPException(status_code=500, detail="Server misconfigured: OPENAI_API_KEY not set")
 
         # Transcribe using OpenAI (Whisper)
-        with open(temp_file_path, "rb") as audio_file:
-            transcript = await asyncio.to_thread(
-                lambda: client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language=language
-                )
+        async with STT_SEM:
+            transcript = await stt_create(
+                model="whisper-1",
+                file=(filename, audio, content_type),
+                language=language
             )
         
-        # Clean up temp file
-        temp_file_path.unlink(missing_ok=True)
-        
         return transcript.text
         
     except Exception as e:
@@ -158,59 +261,187 @@ async def query_llama_async(prompt: str) -> str:
         if client is None:
             raise HTTPException(status_code=500, detail="Server misconfigured: OPENAI_API_KEY not set")
 
-        response = await asyncio.to_thread(
-            lambda: client.chat.completions.create(
+        async with LLM_SEM:
+            response = await llm_create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=300,
                 temperature=0.7
             )
-        )
         return response.choices[0].message.content
         
     except Exception as e:
         logger.error(f"Error querying LLaMA: {e}")
         raise HTTPException(status_code=500, detail=f"LLaMA query failed: {str(e)}")
 
-async def text_to_speech_async(text: str, output_file: str) -> str:
+async def stream_llama_async(prompt: str) -> AsyncIterator[str]:
+    """
+    Asynchronously stream the LLaMA model response as text deltas
+    (placeholder - replace with your actual implementation)
+    
+    Args:
+        prompt (str): The prompt to send to the model
+    
+    Yields:
+        str: Chunks of the model response as they are generated
+    """
+    if client is None:
+        raise HTTPException(status_code=500, detail="Server misconfigured: OPENAI_API_KEY not set")
+
+    async with LLM_SEM:
+        stream = await llm_create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=300,
+            temperature=0.7,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+async def synthesize_speech_async(text: str) -> bytes:
     """
-    Asynchronously convert text to speech using OpenAI's TTS API.
+    Asynchronously synthesize speech using OpenAI's TTS API.
     
     Args:
         text (str): Text to convert
-        output_file (str): Output file path
     
     Returns:
-        str: Path to the generated audio file
+        bytes: MP3 audio content
     """
     try:
         if client is None:
             raise HTTPException(status_code=500, detail="Server misconfigured: OPENAI_API_KEY not set")
 
-        response = await asyncio.to_thread(
-            lambda: client.audio.speech.create(
+        async with TTS_SEM:
+            response = await tts_create(
                 model="gpt-4o-mini-tts",
                 voice="alloy",
                 input=text
             )
-        )
+        return response.content
         
-        async with aiofiles.open(output_file, "wb") as f:
-            await f.write(response.content)
-        
-        return output_file
+    except Exception as e:
+        logger.error(f"Error in text-to-speech: {e}")
+        raise HTTPException(status_code=500, detail=f"Text-to-speech failed: {str(e)}")
+
+async def open_speech_stream_async(text: str) -> AsyncIterator[bytes]:
+    """
+    Asynchronously open a streaming request to OpenAI's TTS API, so the audio
+    can be relayed without buffering the whole file.
+    
+    Args:
+        text (str): Text to convert
+    
+    Returns:
+        AsyncIterator[bytes]: Chunks of MP3 audio as they arrive
+    """
+    stack = AsyncExitStack()
+    try:
+        if client is None:
+            raise HTTPException(status_code=500, detail="Server misconfigured: OPENAI_API_KEY not set")
+
+        # The slot only covers establishing the stream (the SDK raises on a
+        # non-2xx status here); the body is then paced by the HTTP client,
+        # which shouldn't keep an OpenAI slot busy
+        async with TTS_SEM:
+            response = await stack.enter_async_context(tts_stream_create(
+                model="gpt-4o-mini-tts",
+                voice="alloy",
+                input=text,
+                response_format="mp3"
+            ))
         
     except Exception as e:
+        await stack.aclose()
         logger.error(f"Error in text-to-speech: {e}")
         raise HTTPException(status_code=500, detail=f"Text-to-speech failed: {str(e)}")
 
-def create_human_like_prompt(query: str) -> str:
+    async def iter_audio() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.iter_bytes():
+                yield chunk
+        except Exception as e:
+            # Headers are already sent, so all we can do is log and abort
+            logger.error(f"Error streaming text-to-speech: {e}")
+            raise
+        finally:
+            await stack.aclose()
+
+    return iter_audio()
+
+async def recommend_with_speech_async(prompt: str, output_file: str) -> str:
     """
-    Create a more human-like prompt with natural speech patterns
+    Stream the LLM response and synthesize speech sentence by sentence, so
+    TTS runs while the model is still generating instead of after it.
+    
+    Args:
+        prompt (str): The prompt to send to the model
+        output_file (str): Output file path for the concatenated MP3 audio
+    
+    Returns:
+        str: Full recommendation text
     """
-    return f"""Act as a friendly, experienced agricultural trainer who has been working with Senegalese farmers for many years. 
+    slots = asyncio.Semaphore(TTS_PIPELINE_DEPTH)
+    segments: List[asyncio.Task] = []
+
+    async def synthesize(text: str) -> bytes:
+        # At most TTS_PIPELINE_DEPTH segments of this request call TTS at once
+        async with slots:
+            return await synthesize_speech_async(text)
 
-The farmer asked: '{query}'
+    def dispatch(text: str) -> None:
+        # Never blocks, so the LLM stream (and its LLM_SEM slot) isn't held up
+        # waiting for TTS; the 300 token cap bounds how many segments queue up
+        segments.append(asyncio.create_task(synthesize(text)))
+
+    parts = []
+    buffer = ""
+    boundary_pending = False
+    try:
+        async for delta in stream_llama_async(prompt):
+            parts.append(delta)
+            # Punctuation only ends a sentence once whitespace follows it;
+            # otherwise it may be a decimal point ("1" "." "5") split across tokens
+            if boundary_pending and delta[:1].isspace():
+                dispatch(buffer.strip())
+                buffer = ""
+            buffer += delta
+            boundary_pending = False
+            if len(buffer) < TTS_SEGMENT_MIN_CHARS:
+                continue
+            if buffer.endswith(SENTENCE_ENDINGS):
+                boundary_pending = True
+            elif buffer.endswith("\n") or buffer.rstrip().endswith(SENTENCE_ENDINGS):
+                dispatch(buffer.strip())
+                buffer = ""
+        if buffer.strip():
+            dispatch(buffer.strip())
+        
+        # MP3 frames are self-contained, so segments concatenate into one stream
+        audio = b"".join(await asyncio.gather(*segments))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error querying LLaMA: {e}")
+        raise HTTPException(status_code=500, detail=f"LLaMA query failed: {str(e)}")
+    finally:
+        # Also runs on cancellation, so no orphaned segment keeps calling TTS
+        for task in segments:
+            if not task.done():
+                task.cancel()
+    
+    await _write_bytes(output_file, audio)
+    
+    return "".join(parts).strip()
+
+# Fixed prompt template around the farmer's question, built once at import time
+_PROMPT_HEAD = """Act as a friendly, experienced agricultural trainer who has been working with Senegalese farmers for many years. 
+
+The farmer asked: '"""
+
+_PROMPT_TAIL = """'
 
 Respond as if you're having a natural conversation with them. Include:
 - Natural speech patterns with occasional "umm", "well", "you know"
@@ -226,11 +457,46 @@ Example style: "Well, you know... that's a really good question about soil prepa
 
 Your response:"""
 
-@app.post("/recommend-from-audio")
+@functools.lru_cache(maxsize=1024)
+def create_human_like_prompt(query: str) -> str:
+    """
+    Create a more human-like prompt with natural speech patterns
+    """
+    return _PROMPT_HEAD + query + _PROMPT_TAIL
+
+def normalize_transcript(text: str) -> str:
+    """Normalize a transcript for use as a response cache key"""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+def get_cached_response(key: Tuple[str, str]) -> Optional[Tuple[str, Path]]:
+    """Return the cached (recommendation, audio path) if its audio still exists"""
+    cached = RESP_CACHE.get(key)
+    if cached is None:
+        return None
+    try:
+        # Touch the file so the hourly cleanup doesn't delete it under the client
+        os.utime(cached[1])
+    except FileNotFoundError:
+        return None
+    return cached
+
+class RecommendationResponse(BaseModel):
+    """JSON body returned by /recommend-from-audio"""
+    success: bool
+    request_id: str
+    transcribed_query: str
+    recommendation: str
+    audio_download_url: str
+    audio_filename: str
+
+# Declaring the response model lets FastAPI (>= 0.130, see requirements.txt)
+# serialize straight to JSON bytes in pydantic-core instead of going through
+# jsonable_encoder + json.dumps
+@app.post("/recommend-from-audio", response_model=RecommendationResponse)
 async def recommend_from_audio(
-    background_tasks: BackgroundTasks,
     audio_file: UploadFile = File(...),
-    language: str = "en"
+    language: str = "en",
+    stream: bool = False
 ):
     """
     Process uploaded audio file and return agricultural recommendation
@@ -238,9 +504,12 @@ async def recommend_from_audio(
     Args:
         audio_file: Uploaded audio file (WAV, MP3, etc.)
         language: Language code for transcription (default: 'en')
+        stream: Stream the spoken recommendation back directly instead of
+            saving it for download (default: False)
     
     Returns:
-        JSON response with transcription, recommendation, and download link
+        JSON response with transcription, recommendation, and download link,
+        or the MP3 audio itself when `stream` is set
     """
     if not audio_file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
@@ -256,47 +525,112 @@ async def recommend_from_audio(
         )
     
     # Generate unique IDs for this request
-    request_id = uuid.uuid4().hex
+    request_id = secrets.token_hex(8)
+    
+    # Starlette has already spooled the body, so its size is known up front
+    if audio_file.size is not None and audio_file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MiB"
+        )
     
     try:
-        # Save uploaded file
-        upload_path = UPLOAD_DIR / f"{request_id}_{audio_file.filename}"
-        async with aiofiles.open(upload_path, "wb") as f:
-            content = await audio_file.read()
-            await f.write(content)
+        if ARCHIVE_UPLOADS:
+            # Save uploaded file
+            upload_path = UPLOAD_DIR / f"{request_id}_{audio_file.filename}"
+            f = await asyncio.to_thread(open, upload_path, "wb")
+            try:
+                while chunk := await audio_file.read(UPLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            await audio_file.seek(0)
+            logger.info(f"Archived audio file: {upload_path}")
         
-        logger.info(f"Processing audio file: {upload_path}")
+        logger.info(f"Processing audio file: {audio_file.filename} ({request_id})")
         
-        # Step 1: Transcribe audio
-        transcribed_query = await transcribe_audio_async(str(upload_path), language)
+        # Step 1: Transcribe audio straight from Starlette's spooled upload.
+        # Small uploads are passed as bytes: httpx calls fileno() on file
+        # objects, which would roll an in-memory spool over to disk.
+        if audio_file.size is not None and audio_file.size <= UPLOAD_SPOOL_SIZE:
+            audio = await audio_file.read()
+        else:
+            audio = audio_file.file
+        transcribed_query = await transcribe_audio_async(
+            audio_file.filename, audio, audio_file.content_type, language
+        )
         logger.info(f"Transcribed query: {transcribed_query}")
         
-        # Step 2: Generate human-like recommendation
         human_prompt = create_human_like_prompt(transcribed_query)
-        recommendation = await query_llama_async(human_prompt)
-        logger.info(f"Generated recommendation: {recommendation[:100]}...")
+        cache_key = (language, normalize_transcript(transcribed_query))
         
-        # Step 3: Convert to speech
-        output_filename = f"response_{request_id}.mp3"
-        output_path = OUTPUT_DIR / output_filename
-        await text_to_speech_async(recommendation, str(output_path))
+        if stream:
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                logger.info(f"Serving cached audio response for request {request_id}")
+                return FileResponse(
+                    path=str(cached[1]),
+                    media_type="audio/mpeg",
+                    headers={
+                        "Content-Disposition": f'inline; filename="{cached[1].name}"',
+                        "X-Request-ID": request_id
+                    }
+                )
+            
+            # Step 2: Generate human-like recommendation
+            recommendation = await query_llama_async(human_prompt)
+            logger.info(f"Generated recommendation: {recommendation[:100]}...")
+            
+            # Step 3: Stream speech straight to the client, skipping the disk
+            output_filename = f"response_{request_id}.mp3"
+            audio_stream = await open_speech_stream_async(recommendation)
+            logger.info(f"Streaming audio response for request {request_id}")
+            return StreamingResponse(
+                audio_stream,
+                media_type="audio/mpeg",
+                headers={
+                    "Content-Disposition": f'inline; filename="{output_filename}"',
+                    "X-Request-ID": request_id
+                }
+            )
         
-        # Schedule cleanup of upload file
-        background_tasks.add_task(lambda: upload_path.unlink(missing_ok=True))
+        # Only one request per question generates the answer; concurrent
+        # duplicates wait on the lock and then hit the cache
+        key_lock = _RESP_CACHE_LOCKS.setdefault(cache_key, _KeyLock())
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                cached = get_cached_response(cache_key)
+                if cached is not None:
+                    recommendation, output_path = cached
+                    logger.info(f"Serving cached recommendation for request {request_id}")
+                else:
+                    # Step 2 & 3: Generate human-like recommendation and convert it to
+                    # speech, synthesizing each sentence while the LLM is still streaming
+                    output_path = OUTPUT_DIR / f"response_{request_id}.mp3"
+                    recommendation = await recommend_with_speech_async(human_prompt, str(output_path))
+                    logger.info(f"Generated recommendation: {recommendation[:100]}...")
+                    RESP_CACHE[cache_key] = (recommendation, output_path)
+        finally:
+            key_lock.users -= 1
+            if key_lock.users == 0:
+                del _RESP_CACHE_LOCKS[cache_key]
+        
+        output_filename = output_path.name
         
         # Generate download URL
         download_url = f"/download-audio/{output_filename}"
         
         logger.info(f"Successfully processed request {request_id}")
         
-        return JSONResponse({
-            "success": True,
-            "request_id": request_id,
-            "transcribed_query": transcribed_query,
-            "recommendation": recommendation,
-            "audio_download_url": download_url,
-            "audio_filename": output_filename
-        })
+        return RecommendationResponse(
+            success=True,
+            request_id=request_id,
+            transcribed_query=transcribed_query,
+            recommendation=recommendation,
+            audio_download_url=download_url,
+            audio_filename=output_filename
+        )
         
     except HTTPException:
         raise
@@ -305,27 +639,31 @@ async def recommend_from_audio(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/download-audio/{filename}")
-async def download_audio(filename: str):
+async def download_audio(filename: str, download: bool = False):
     """
-    Download generated audio file
+    Serve generated audio file
     
     Args:
-        filename: Name of the audio file to download
+        filename: Name of the audio file to serve
+        download: Send as an attachment instead of inline (default: False)
     
     Returns:
-        Audio file as download
+        Audio file, inline so players can seek with Range requests, or as a
+        download when `download` is set
     """
     file_path = OUTPUT_DIR / filename
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found")
     
-    return FileResponse(
-        path=str(file_path),
-        media_type="audio/mpeg",
-        filename=filename,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    # FileResponse handles Range requests and sends the body with sendfile(2)
+    if download:
+        return FileResponse(
+            path=str(file_path),
+            media_type="audio/mpeg",
+            filename=filename
+        )
+    return FileResponse(path=str(file_path), media_type="audio/mpeg")
 
 @app.get("/health")
 async def health_check():
@@ -346,17 +684,17 @@ async def root():
     }
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
-
-    # Run with optimized settings
-    # uvicorn.run(
-    #     "main:app",
-    #     host="0.0.0.0",
-    #     port=8000,
-    #     reload=False,  # Disable in production
-    #     workers=1,     # Adjust based on your server capacity
-      
-    #     http="httptools",  # Use faster HTTP parser
-    #     log_level="info"
-    # )
+
+    # uvloop + httptools cut per-request overhead; uvloop is unavailable on Windows.
+    # Each worker is a separate process with its own semaphores and response cache.
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+        log_level=os.getenv("LOG_LEVEL", "info").lower()
+    )
@@ -1,66 +1,83 @@
 import argparse
+import asyncio
 import mimetypes
 import os
 import sys
-import requests
+import httpx
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Send an audio file to the FastAPI backend.")
-    parser.add_argument("file", help="Path to the audio file (wav/mp3/m4a/ogg/flac)")
+async def send_file(client, semaphore, args, path):
+    """Upload one audio file and optionally download the generated response. Returns an exit code."""
+    endpoint = f"{args.base_url.rstrip('/')}/recommend-from-audio"
+
+    mime, _ = mimetypes.guess_type(path)
+    mime = mime or "application/octet-stream"
+
+    async with semaphore:
+        with open(path, "rb") as f:
+            files = {
+                # Field name must match backend parameter name `audio_file`
+                "audio_file": (os.path.basename(path), f, mime),
+            }
+            # The backend reads `language` from the query string
+            params = {"language": args.language}
+
+            try:
+                resp = await client.post(endpoint, files=files, params=params)
+            except httpx.HTTPError as e:
+                print(f"[{path}] Request failed:", e)
+                return 2
+
+        print(f"[{path}] Status:", resp.status_code)
+
+        # Try to print JSON if available; otherwise print text
+        try:
+            payload = resp.json()
+            print(f"[{path}] Response:", payload)
+        except ValueError:
+            print(f"[{path}] Response (text):", resp.text)
+            return 0 if resp.is_success else 3
+
+        if not resp.is_success:
+            return 3
+
+        # Optionally download generated audio, streaming it to disk
+        if args.download and isinstance(payload, dict) and payload.get("audio_download_url"):
+            download_url = f"{args.base_url.rstrip('/')}{payload['audio_download_url']}"
+            out_name = payload.get("audio_filename") or f"response_{payload.get('request_id','')}.mp3"
+            try:
+                async with client.stream("GET", download_url) as r:
+                    r.raise_for_status()
+                    with open(out_name, "wb") as out:
+                        async for chunk in r.aiter_bytes():
+                            out.write(chunk)
+                print(f"[{path}] Downloaded audio to: {out_name}")
+            except httpx.HTTPError as e:
+                print(f"[{path}] Failed to download audio:", e)
+
+    return 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Send audio files to the FastAPI backend.")
+    parser.add_argument("files", nargs="+", help="Path(s) to audio files (wav/mp3/m4a/ogg/flac)")
     parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API base URL")
     parser.add_argument("--language", default="en", help="Language code for transcription (default: en)")
     parser.add_argument("--download", action="store_true", help="Download generated audio response")
+    parser.add_argument("--concurrency", type=int, default=1, help="Maximum requests in flight (default: 1)")
     args = parser.parse_args()
 
-    if not os.path.isfile(args.file):
-        print(f"File not found: {args.file}")
-        sys.exit(1)
+    for path in args.files:
+        if not os.path.isfile(path):
+            print(f"File not found: {path}")
+            sys.exit(1)
 
-    endpoint = f"{args.base_url.rstrip('/')}/recommend-from-audio"
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+    async with httpx.AsyncClient(timeout=120) as client:
+        codes = await asyncio.gather(*(send_file(client, semaphore, args, path) for path in args.files))
 
-    mime, _ = mimetypes.guess_type(args.file)
-    mime = mime or "application/octet-stream"
-
-    with open(args.file, "rb") as f:
-        files = {
-            # Field name must match backend parameter name `audio_file`
-            "audio_file": (os.path.basename(args.file), f, mime),
-        }
-        data = {"language": args.language}
-
-        try:
-            resp = requests.post(endpoint, files=files, data=data, timeout=120)
-        except requests.RequestException as e:
-            print("Request failed:", e)
-            sys.exit(2)
-
-    print("Status:", resp.status_code)
-
-    # Try to print JSON if available; otherwise print text
-    try:
-        payload = resp.json()
-        print("Response:", payload)
-    except ValueError:
-        print("Response (text):", resp.text)
-        sys.exit(0 if resp.ok else 3)
-
-    if not resp.ok:
-        sys.exit(3)
-
-    # Optionally download generated audio
-    if args.download and isinstance(payload, dict) and payload.get("audio_download_url"):
-        download_url = f"{args.base_url.rstrip('/')}{payload['audio_download_url']}"
-        out_name = payload.get("audio_filename") or f"response_{payload.get('request_id','')}.mp3"
-        try:
-            r = requests.get(download_url, timeout=120)
-            r.raise_for_status()
-            with open(out_name, "wb") as out:
-                out.write(r.content)
-            print(f"Downloaded audio to: {out_name}")
-        except requests.RequestException as e:
-            print("Failed to download audio:", e)
+    sys.exit(max(codes))
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())